@@ -10,4 +10,5 @@ $activate = ".\$envName\Scripts\Activate.ps1"
 
 python -m pip install --upgrade pip
 pip install -r requirements.txt
+python src/compile_prompts.py
 python src/db.py
\ No newline at end of file
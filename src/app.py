@@ -5,12 +5,21 @@ import os
 #Import all environment variables
 load_dotenv()
 HF_TOKEN = os.getenv("HF_TOKEN")
-MAX_TOKENS = os.getenv("MAX_TOKENS")
 MODEL = os.getenv("MODEL")
 USER = os.getenv("USER")
 PASSWORD = os.getenv("PASSWORD")
 URI = os.getenv("URI")
 DB_NAME = os.getenv("DB_NAME")
+CYPHER_RUNTIME = os.getenv("CYPHER_RUNTIME", "slotted")
+
+#Validate configuration once at startup
+missing_vars = [name for name in ["HF_TOKEN", "MODEL", "USER", "PASSWORD", "URI", "DB_NAME"] if globals()[name] is None]
+if len(missing_vars) > 0:
+    raise KeyError(f"Missing environment variables {missing_vars}")
+try:
+    MAX_TOKENS = int(os.getenv("MAX_TOKENS", "512"))
+except ValueError:
+    raise ValueError(f"MAX_TOKENS must be an integer, got {os.getenv('MAX_TOKENS')!r}") from None
 
 
 
@@ -24,7 +33,8 @@ if __name__ == "__main__":
     "url": URI,
     "username": USER,
     "password": PASSWORD,
-    "database": DB_NAME
+    "database": DB_NAME,
+    "runtime": CYPHER_RUNTIME
     }
     
     chat = MovieChatBot(HF_TOKEN, db_connection, MODEL, MAX_TOKENS)
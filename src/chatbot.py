@@ -1,47 +1,176 @@
-from langchain_core.prompts import PromptTemplate
 from langchain_neo4j import Neo4jGraph
-from huggingface_hub import InferenceClient
+from langchain_huggingface import HuggingFaceEmbeddings
 from neo4j.exceptions import CypherSyntaxError
-import yaml
+from neo4j import READ_ACCESS
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from prompt_cache import PromptCache
+from template_cache import TemplateCache
+from inference_client import KeepAliveInferenceClient
+from compile_prompts import load_prompt_templates
+from functools import partial
+import threading
+import logging
+import asyncio
 import os
+import json
 import ast
+import re
+
+
+logger = logging.getLogger(__name__)
+
+#Marker of LLM answer requesting additional context, followed by question for retrieval system
+NO_CONTEXT = "<<NO_CTX>>"
+#End of first sentence or line of streamed answer, answer is printed only after it is complete without the marker
+SENTENCE_END = re.compile(r"[.!?]\s|\n")
+
+#Quoted string literals in Cypher, escaped characters (e.g. \') are part of the literal
+CYPHER_STRING_LITERAL = re.compile(r"'((?:[^'\\\n]|\\.)*)'|\"((?:[^\"\\\n]|\\.)*)\"")
+#Escape sequence in Cypher string literal
+CYPHER_ESCAPE = re.compile(r"\\(.)")
+
+#Replace string literals in Cypher query with parameters, so equivalent queries share one execution plan
+#Escaped quotes and backslashes are unescaped in parameter values, literals with other escapes are left in the query
+#Example: "MATCH (m:Movie {title:'Schindler\\'s List'})" -> ("MATCH (m:Movie {title:$p0})", {"p0": "Schindler's List"})
+#Arguments:
+# cypher_query:str - Cypher query with inlined string literals
+#Returns: tuple[str, dict[str,str]] - Query template and dictionary of extracted parameters
+def parameterize_cypher(cypher_query:str):
+    params = {}
+    def replace(match):
+        value = match.group(1) if match.group(1) is not None else match.group(2)
+        if any(char not in "'\"\\" for char in CYPHER_ESCAPE.findall(value)):
+            return match.group(0)
+        name = f"p{len(params)}"
+        params[name] = CYPHER_ESCAPE.sub(r"\1", value)
+        return "$" + name
+    return CYPHER_STRING_LITERAL.sub(replace, cypher_query), params
+
+#Remove trailing semicolons and comments from Cypher query, so clause appended to it is not commented out
+#Arguments:
+# cypher_query:str - Cypher query
+#Returns: str - Cypher query ending with its last clause
+def strip_cypher_end(cypher_query:str):
+    while True:
+        cypher_query = cypher_query.strip().rstrip(";").rstrip()
+        if cypher_query.endswith("*/") and "/*" in cypher_query:
+            cypher_query = cypher_query[:cypher_query.rfind("/*")]
+            continue
+        #Line comment is searched outside string literals (e.g. 'http://...')
+        last_line = cypher_query.rsplit("\n", 1)[-1]
+        masked_line = CYPHER_STRING_LITERAL.sub(lambda match: " " * len(match.group(0)), last_line)
+        comment_start = masked_line.find("//")
+        if comment_start < 0:
+            return cypher_query
+        cypher_query = cypher_query[:len(cypher_query) - len(last_line) + comment_start]
+
+#Append LIMIT clause to Cypher query returning rows without limit
+#Arguments:
+# cypher_query:str - Cypher query
+# limit:int - Maximum number of returned rows
+#Returns: str - Cypher query with LIMIT clause
+def limit_cypher(cypher_query:str, limit:int):
+    cypher_query = strip_cypher_end(cypher_query)
+    if re.search(r"\bLIMIT\b", cypher_query, flags=re.IGNORECASE) or not re.search(r"\bRETURN\b", cypher_query, flags=re.IGNORECASE):
+        return cypher_query
+    return f"{cypher_query} LIMIT {limit}"
+
+#Inline parameters back into Cypher query created by parameterize_cypher
+#Arguments:
+# cypher_template:str - Query with $p0, $p1, ... parameters
+# params:dict[str,str] - Values of parameters
+#Returns: str|None - Cypher query or None if value cannot be quoted
+def fill_cypher(cypher_template:str, params:dict[str, str]):
+    if any("'" in value and '"' in value or "\\" in value for value in params.values()):
+        return None
+    def replace(match):
+        value = params[match.group(1)]
+        return f'"{value}"' if "'" in value else f"'{value}'"
+    return re.sub(r"\$(p\d+)\b", replace, cypher_template)
+
+#Transform LLM answer with template ["query1", "query2",...] to list of queries
+#Arguments:
+# answer:str - LLM answer with list of queries or single query
+#Returns: list[str] - List of Cypher queries
+def parse_cypher_queries(answer:str):
+    if not answer.lstrip().startswith("["):
+        return [answer]
+    try:
+        queries = json.loads(answer)
+    except ValueError:
+        try:
+            queries = ast.literal_eval(answer)
+        except (SyntaxError, ValueError):
+            return [answer]
+    if not isinstance(queries, list):
+        return [answer]
+    queries = [query for query in queries if isinstance(query, str)]
+    return queries if queries else [answer]
 
 
 class MovieChatBot():
     
+    #System prompts for LLM calls
+    _SYS_CYPHER = "You are an expert Neo4j Cypher generator."
+    _SYS_CHAT = "You are movie chatbot"
+    _SYS_SUMMARY = "You summarize conversations"
+    
     #Initialization of the chatbot
     #Arguments:
     # hf_token:str - HuggingFace API token for LLM
     # db_connection:dict[str,str] - Dictionary with Neo4j connection parameters (url, username, password, database)
+    #                               and optional Cypher runtime (runtime, default slotted, pipelined is available on Enterprise)
     # model:str - model name for LLM
     # max_tokens:int - Maximum tokens allowed for LLM response
     #Returns: None
     #Raises: KeyError if required keys are missing in db_connection
+    #        ValueError if cypher prompt template has unexpected variables
     def __init__(self, hf_token: str, db_connection: dict[str, str], model:str, max_tokens:int):
         
         #State variables
-        self._chat_history = []    #Stores conversation history
+        self._chat_history = []    #Stores recent conversation history
+        self._history_window = 6   #Number of recent question-answer pairs kept in chat history
+        self._max_rag_iters = 3    #Maximum number of retrieval rounds for single user question
+        self._max_context_rows = 25 #Maximum number of query result rows passed to LLM as context, also LIMIT of generated queries
+        self._summary = ""         #Summary of older conversation removed from chat history
+        self._max_summary_chars = 1000 #Maximum length of summary, the oldest part is cut if LLM returns longer one
         self._rag_question = ""    #Current RAG question
         self._question = ""        #Current user question
         self._answer = ""          #Current answer from LLM
         self._context = []         #Additional context for RAG
         self._previous_queries = [] #List of previous failed Cypher queries
         self._used_queries = []     #List of used queries that returned context
+        self._executed_queries = set() #Set of Cypher queries already executed for current question
+        self._answer_streamed = False #True if current answer was already printed while streaming
+        self._query_cache = OrderedDict() #LRU cache of graph query results keyed by Cypher text
+        self._query_cache_size = 512
+        self._query_cache_lock = threading.Lock()
+        self._query_executor = ThreadPoolExecutor(max_workers=8) #Threads for blocking Neo4j calls
         
-        #LLM client
-        self._client = InferenceClient(model=model, token=hf_token)
+        #LLM client (connections to inference endpoint are reused between calls)
+        self._client = KeepAliveInferenceClient(model=model, token=hf_token)
         self._max_tokens = max_tokens
         
-        #Prompt templates
-        base_path = os.path.dirname(__file__)
-        prompts_path = os.path.join(base_path, "prompts.yaml")
-        with open(prompts_path, "r", encoding="utf-8") as f:
-            prompts = yaml.safe_load(f)
-        self._cypher_prompt_template = PromptTemplate.from_template(
-            prompts["cypher_prompt"], 
-            partial_variables={"cypher_schema": prompts["cypher_schema"], "cypher_examples": prompts["cypher_examples"]}
+        #Cache of generated Cypher queries ("cypher" namespace), chat answers depend on history and are not cached
+        self._prompt_cache = PromptCache(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
+        #Cache of Cypher queries for question templates, kept for whole session
+        self._template_cache = TemplateCache()
+        
+        #Prompt templates (compiled prompts.pkl is used if available, see compile_prompts.py)
+        prompts = load_prompt_templates()
+        self._cypher_prompt_template = prompts["cypher_prompt"]
+        cypher_variables = set(self._cypher_prompt_template.input_variables)
+        if cypher_variables != {"question", "previous_queries", "used_queries"}:
+            raise ValueError(f"Unexpected cypher prompt variables {sorted(cypher_variables)}")
+        #Cypher prompt is formatted directly with str.format, it is built on every RAG iteration
+        self._cypher_prompt_format = partial(
+            self._cypher_prompt_template.template.format,
+            **self._cypher_prompt_template.partial_variables
         )
-        self._base_template = PromptTemplate.from_template(prompts["base"])
+        self._history_summary_template = prompts["history_summary"]
+        self._base_template = prompts["base"]
+        self._base_template_partial = self._base_template.partial(chat_history=self._render_chat_history())
         
         #Neo4j graph database connection
         missing_keys = list(set(["url", "username", "password", "database"]) - set(db_connection.keys()))
@@ -52,8 +181,10 @@ class MovieChatBot():
                 url = db_connection["url"],
                 username = db_connection["username"],
                 password = db_connection["password"],
-                database = db_connection["database"]
+                database = db_connection["database"],
+                driver_config = {"max_connection_pool_size": 16}
             )
+            self._cypher_runtime = db_connection.get("runtime", "slotted")
     
     ### SET OF FUNCTIONS TO CREATE MODEL PROMPT AND GET ANSWER
     
@@ -61,63 +192,235 @@ class MovieChatBot():
     #Arguments:
     # system_prompt:str - System message to guide the LLM
     # user_prompt:str - User question or input
+    # stream:bool - If True, answer is printed to the user while it is generated
+    # cache_namespace:str - Optional namespace of response cache, if None cache is not used
+    # semantic_key:str - Optional text used to find semantically similar cached response
     #Returns: str - Generated response from LLM
-    def generate_chat_anserw(self, system_prompt:str, user_prompt:str):
-        messages = [{"role": "system", "content": system_prompt}]
-        messages += [{"role": "user", "content": user_prompt}]
-        response = self._client.chat_completion(
+    async def generate_chat_anserw(self, system_prompt:str, user_prompt:str, stream:bool = False,
+                                   cache_namespace:str = None, semantic_key:str = None):
+        self._answer_streamed = False
+        semantic_vector = None
+        if cache_namespace is not None:
+            if semantic_key is not None:
+                #Embedding model runs in thread, so it does not block the event loop
+                semantic_vector = await asyncio.get_running_loop().run_in_executor(None, self._prompt_cache.embed, semantic_key)
+            answer = self._prompt_cache.get(cache_namespace, system_prompt, user_prompt, semantic_vector)
+            if answer is not None:
+                return answer
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+        if stream:
+            answer = await self._stream_chat_anserw(messages)
+        else:
+            response = await self._client.chat_completion(
+                messages=messages,
+                max_tokens = self._max_tokens,
+                temperature = 0.1
+            )
+            answer = response.choices[0].message["content"]
+        if cache_namespace is not None:
+            self._prompt_cache.put(cache_namespace, system_prompt, user_prompt, answer, semantic_vector)
+        return answer
+    
+    #Stream answer from LLM and print it as soon as it is known to be the final answer
+    #Output is held back until the first sentence or line is complete without NO_CONTEXT marker,
+    #answers with the marker there are requests for additional data and are not printed
+    #Answer with marker appearing after printing started is still a request for additional data, the marker is not shown,
+    #printed part is closed with short notice and the whole answer is returned, so retrieval runs
+    #Arguments:
+    # messages:list[dict[str,str]] - Messages for LLM
+    #Returns: str - Generated response from LLM
+    async def _stream_chat_anserw(self, messages:list[dict[str, str]]):
+        answer = ""
+        printed = 0
+        marker_start = -1
+        async for chunk in await self._client.chat_completion(
             messages=messages,
             max_tokens = self._max_tokens,
-            temperature = 0.1
-        )
-        return response.choices[0].message["content"]
+            temperature = 0.1,
+            stream = True
+        ):
+            answer += chunk.choices[0].delta.content or ""
+            if marker_start >= 0:
+                continue
+            if not self._answer_streamed:
+                if NO_CONTEXT in answer or not SENTENCE_END.search(answer.lstrip()):
+                    continue
+                print("Bot: ", end="")
+                self._answer_streamed = True
+            marker_start = answer.find(NO_CONTEXT)
+            #Text which can be the beginning of the marker is not printed yet
+            end = marker_start if marker_start >= 0 else len(answer) - len(NO_CONTEXT) + 1
+            if end > printed:
+                print(answer[printed:end], end="", flush=True)
+                printed = end
+        if self._answer_streamed:
+            marker_start = answer.find(NO_CONTEXT)
+            if marker_start >= 0:
+                print(" (searching for more data...)\n")
+                self._answer_streamed = False
+            else:
+                print(answer[printed:], end="")
+                print("\n")
+        elif NO_CONTEXT not in answer:
+            print(f"Bot: {answer}\n")
+            self._answer_streamed = True
+        return answer
+    
+    #Generate user prompt for chat answer from base template with current question and context
+    #Chat history is already rendered in partial template, it is refreshed only when history changes
+    #Arguments: None
+    #Returns: str - User prompt for LLM
+    def generate_chat_prompt(self):
+        return self._base_template_partial.invoke({
+            "question": self._question,
+            "context": self._context
+        }).to_string()
     
     #Generate a Cypher query using LLM based on current RAG question
+    #Similar RAG questions reuse cached queries only on first attempt, so failed queries are not repeated
     #Arguments: None
     #Returns: str - Generated Cypher query or list of queries
-    def generate_cypher_query(self):
-        return self.generate_chat_anserw(
-            system_prompt = "You are an expert Neo4j Cypher generator.",
-            user_prompt = self._cypher_prompt_template.invoke({
-                "question": self._rag_question, 
-                "previous_queries": self._previous_queries,
-                "used_quries": self._used_queries
-            }).to_string()
+    async def generate_cypher_query(self):
+        first_attempt = len(self._previous_queries) == 0 and len(self._used_queries) == 0
+        return await self.generate_chat_anserw(
+            system_prompt = self._SYS_CYPHER,
+            user_prompt = self._cypher_prompt_format(
+                question = self._rag_question,
+                previous_queries = self._previous_queries,
+                used_queries = self._used_queries
+            ),
+            cache_namespace = "cypher",
+            semantic_key = self._rag_question if first_attempt else None
         )
     
+    ### SET OF FUNCTIONS TO RETRIEVE CONTEXT FROM GRAPH DATABASE
+    
+    #Execute Cypher query in the graph database, repeated queries are answered from LRU cache
+    #Query is run with runtime hint in read only session, so cluster can route it to read replica
+    #Arguments:
+    # cypher_query:str - Cypher query to execute
+    #Returns: list[dict] - Query results
+    #Raises: CypherSyntaxError if query is invalid
+    def _cached_graph_query(self, cypher_query:str):
+        with self._query_cache_lock:
+            if cypher_query in self._query_cache:
+                self._query_cache.move_to_end(cypher_query)
+                return self._query_cache[cypher_query]
+        template, params = parameterize_cypher(cypher_query)
+        if not template.lstrip().upper().startswith("CYPHER "):
+            template = f"CYPHER runtime={self._cypher_runtime} {template}"
+        result = self._graphDB.query(template, params, session_params={"default_access_mode": READ_ACCESS})
+        with self._query_cache_lock:
+            self._query_cache[cypher_query] = result
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return result
+    
+    #Execute single Cypher query in the graph database
+    #Query without LIMIT gets one, result is passed to LLM as compact JSON with at most max_context_rows rows
+    #Arguments:
+    # cypher_query:str - Cypher query to execute
+    #Returns: tuple[str, str|None] - Query (prefixed with failure reason if failed) and its context or None
+    def _run_cypher_query(self, cypher_query:str):
+        cypher_query = limit_cypher(cypher_query, self._max_context_rows)
+        try:
+            rows = self._cached_graph_query(cypher_query)
+            if len(rows) == 0:
+                return "No data generated for this query: " + cypher_query, None
+        except CypherSyntaxError:
+            print("System: System error, cannot provide additional data\n")
+            return "Invalid syntax of this query: " + cypher_query, None
+        context = json.dumps(rows[:self._max_context_rows], default=str, separators=(",", ":"))
+        if len(rows) > self._max_context_rows:
+            context += f" (partial data: first {self._max_context_rows} of {len(rows)} rows)"
+        return cypher_query, context
+    
+    #Execute independent Cypher queries concurrently in the graph database
+    #Blocking Neo4j calls run in worker threads, so the event loop is not stalled
+    #Arguments:
+    # queries:list[str] - List of Cypher queries to execute
+    #Returns: list[tuple[str, str|None]] - Results of _run_cypher_query in the same order as queries
+    async def _run_cypher_batch(self, queries:list[str]):
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[
+            loop.run_in_executor(self._query_executor, self._run_cypher_query, query) for query in queries
+        ])
+    
+    #Render chat history for base template, summary of older conversation goes first
+    #Arguments: None
+    #Returns: str - Chat history as string
+    def _render_chat_history(self):
+        if self._summary:
+            return str([{"role": "summary", "content": self._summary}] + self._chat_history)
+        return str(self._chat_history)
+    
+    #Save results of executed queries, failed queries go to previous queries, others to context
+    #Arguments:
+    # results:list[tuple[str, str|None]] - Results of _run_cypher_batch
+    #Returns: None
+    def _store_query_results(self, results:list[tuple[str, str]]):
+        for cypher_query, context in results:
+            if context == None:
+                self._previous_queries.append(cypher_query)
+            else:
+                self._context.append(context)
+                self._used_queries.append(cypher_query)
+    
     #Save current conversation to chat history
+    #Pairs older than history window are removed and merged by LLM with previous summary into single summary,
+    #so prompt size stays bounded
     #Arguments: None
     #Returns: None
-    def save_chat_history(self):
+    async def save_chat_history(self):
         self._chat_history.append({"role": "user", "content": self._question, "context": self._context})
         self._chat_history.append({"role": "assistant", "content": self._answer})
+        while len(self._chat_history) > 2 * self._history_window:
+            exchange = self._chat_history[:2]
+            del self._chat_history[:2]
+            summary = await self.generate_chat_anserw(
+                system_prompt = self._SYS_SUMMARY,
+                user_prompt = self._history_summary_template.invoke({"summary": self._summary, "exchange": exchange}).to_string()
+            )
+            self._summary = summary.strip()[-self._max_summary_chars:]
+        self._base_template_partial = self._base_template.partial(chat_history=self._render_chat_history())
         
     #Restart the conversation and reset all state variables
     #Arguments: None
     #Returns: None
     def restart(self):
         self._chat_history = []
+        self._summary = ""
+        self._base_template_partial = self._base_template.partial(chat_history=self._render_chat_history())
         self._rag_question = ""
         self._question = ""
         self._answer = ""
         self._context = []
         self._previous_queries = []
         self._used_queries = []
+        self._executed_queries = set()
+        self._answer_streamed = False
     
     ### MAIN APP
     
-    #Main interactive chat loop
+    #Main interactive chat loop, runs asynchronous chat loop until user quits
     #Arguments: None
     #Returns: None
     def chat(self):
+        asyncio.run(self.chat_async())
+    
+    #Asynchronous interactive chat loop
+    #Arguments: None
+    #Returns: None
+    async def chat_async(self):
         print("Chatbot ready! Type 'exit' to quit. Type 'restart' to restart whole conversation.\n")
         while True:
-            #Getting question from user
-            user_q = input("You: ")
+            #Getting question from user (blocking input runs in thread, so event loop keeps running)
+            user_q = await asyncio.get_running_loop().run_in_executor(None, input, "You: ")
             
             #End of app
             if user_q.lower() in ["exit", "quit"]:
                 self.restart()
+                await self._client.close()
                 break
             
             #Restart conversation
@@ -131,65 +434,71 @@ class MovieChatBot():
                 self._context = []
                 self._used_queries = []
                 self._previous_queries = []
+                self._executed_queries = set()
+                
+                #Question with the same structure as already answered one reuses its Cypher query with new values
+                template_match = self._template_cache.match(self._question)
+                template_query = fill_cypher(*template_match) if template_match else None
+                if template_query is not None:
+                    self._executed_queries.add(template_query)
+                    self._store_query_results(await self._run_cypher_batch([template_query]))
                 
                 #Generate user prompt using base template
-                user_prompt = self._base_template.invoke({
-                    "question": self._question,
-                    "context" : self._context,
-                    "chat_history": self._chat_history
-                }).to_string()
+                user_prompt = self.generate_chat_prompt()
                 
                 #Get initial answer from LLM
-                self._answer = self.generate_chat_anserw(
-                    system_prompt = "You are movie chatbot",
-                    user_prompt = user_prompt
+                self._answer = await self.generate_chat_anserw(
+                    system_prompt = self._SYS_CHAT,
+                    user_prompt = user_prompt,
+                    stream = True
                 )
                 
-                #If answer contains NO_CONTEXT, use RAG to retrieve additional context
-                while "NO_CONTEXT" in self._answer:
-                    rag_question = self._answer.split("NO_CONTEXT")
-                    self._rag_question = rag_question[-1].strip()
-                    cypher_queries_list = self.generate_cypher_query()
+                #If answer contains NO_CONTEXT marker, use RAG to retrieve additional context
+                #Question for retrieval system is the text after the last marker
+                #Loop stops after max_rag_iters rounds or when the same retrieval question is asked again after round
+                #without new queries (repeated question after failed queries is a retry with previous queries as feedback)
+                _, marker, rag_question = self._answer.rpartition(NO_CONTEXT)
+                seen_rag_questions = set()
+                new_queries = []
+                rag_iters = 0
+                while marker:
+                    self._rag_question = rag_question.strip()
+                    if rag_iters >= self._max_rag_iters or (self._rag_question in seen_rag_questions and not new_queries):
+                        self._answer = "I'm sorry, I could not find enough data to answer this question."
+                        break
+                    seen_rag_questions.add(self._rag_question)
+                    rag_iters += 1
+                    cypher_queries_list = parse_cypher_queries(await self.generate_cypher_query())
                     
-                    #Transform string to list
-                    try:
-                        cypher_queries_list = ast.literal_eval(cypher_queries_list)
-                    except SyntaxError:
-                        cypher_queries_list = [cypher_queries_list]
-
-                    #Execute each generated query
-                    for i, cypher_query in enumerate(cypher_queries_list):
-                        try:
-                            
-                            context = str(self._graphDB.query(cypher_query))
-                            if context.strip() == "[]":
-                                cypher_query = "No data generated for this query: " + cypher_query
-                                context = None
-                        except CypherSyntaxError:
-                            print("System: System error, cannot provide additional data\n")
-                            cypher_query = "Invalid syntax of this query: " + cypher_query
-                            context = None
-                        
-                        #Save failed queries
-                        if context == None:
-                            self._previous_queries.append(cypher_query)
+                    #Remove duplicates and queries already executed for this question
+                    new_queries = []
+                    for cypher_query in dict.fromkeys(cypher_queries_list):
+                        if cypher_query in self._executed_queries:
+                            self._previous_queries.append("Already executed query, do not generate it again: " + cypher_query)
                         else:
-                            self._context.append(context)
-                            self._used_queries.append(cypher_query)
+                            new_queries.append(cypher_query)
+                    self._executed_queries.update(new_queries)
+
+                    #Execute generated queries concurrently, results keep original order
+                    self._store_query_results(await self._run_cypher_batch(new_queries))
 
                     #Generate answer again with additional context
-                    user_prompt = self._base_template.invoke({
-                        "question": self._question,
-                        "context":  self._context,
-                        "chat_history": self._chat_history
-                    }).to_string()
+                    user_prompt = self.generate_chat_prompt()
                     
-                    self._answer = self.generate_chat_anserw(
-                        system_prompt = "You are movie chatbot",
+                    self._answer = await self.generate_chat_anserw(
+                        system_prompt = self._SYS_CHAT,
                         user_prompt = user_prompt,
+                        stream = True
                     )
+                    _, marker, rag_question = self._answer.rpartition(NO_CONTEXT)
+                logger.debug("Retrieval rounds for question %r: %d", self._question, rag_iters)
+                
+                #Question answered with single query in one retrieval round becomes template for similar questions
+                if not marker and rag_iters == 1 and len(self._used_queries) == 1:
+                    self._template_cache.add(self._question, *parameterize_cypher(self._used_queries[0]))
 
-                #Print answer and save to chat history
-                print(f"Bot: {self._answer}\n")
-                self.save_chat_history()
+                #Print answer (if not already streamed) and save to chat history
+                if not self._answer_streamed:
+                    print(f"Bot: {self._answer}\n")
+                await self.save_chat_history()
 
@@ -0,0 +1,47 @@
+from langchain_core.prompts import PromptTemplate
+import pickle
+import yaml
+import os
+
+#Files with prompt templates
+BASE_PATH = os.path.dirname(__file__)
+PROMPTS_YAML = os.path.join(BASE_PATH, "prompts.yaml")
+PROMPTS_PKL = os.path.join(BASE_PATH, "prompts.pkl")
+
+#Build prompt templates from YAML file
+#Arguments:
+# prompts_path:str - Path to YAML file with prompts
+#Returns: dict[str, PromptTemplate] - Templates for cypher generation, history summary and chat answer
+def build_prompt_templates(prompts_path:str = PROMPTS_YAML):
+    with open(prompts_path, "r", encoding="utf-8") as f:
+        prompts = yaml.safe_load(f)
+    return {
+        "cypher_prompt": PromptTemplate.from_template(
+            prompts["cypher_prompt"],
+            partial_variables={"cypher_schema": prompts["cypher_schema"], "cypher_examples": prompts["cypher_examples"]}
+        ),
+        "history_summary": PromptTemplate.from_template(prompts["history_summary"]),
+        "base": PromptTemplate.from_template(prompts["base"])
+    }
+
+#Load prompt templates from compiled pickle file, fall back to YAML if pickle is missing or older than YAML
+#Arguments: None
+#Returns: dict[str, PromptTemplate] - Templates for cypher generation, history summary and chat answer
+def load_prompt_templates():
+    if os.path.exists(PROMPTS_PKL) and os.path.getmtime(PROMPTS_PKL) >= os.path.getmtime(PROMPTS_YAML):
+        try:
+            with open(PROMPTS_PKL, "rb") as f:
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass
+    return build_prompt_templates()
+
+
+if __name__ == "__main__":
+
+    ##########################
+    #Compiling prompts to pkl#
+    ##########################
+    with open(PROMPTS_PKL, "wb") as f:
+        pickle.dump(build_prompt_templates(), f)
+    print(f"Prompt templates compiled to {PROMPTS_PKL}")
@@ -2,6 +2,7 @@ from dotenv import load_dotenv
 import os
 from langchain_huggingface import HuggingFaceEmbeddings
 from neo4jdb import Neo4jDB
+import torch
 
 
 
@@ -10,6 +11,7 @@ USER = os.getenv("USER")
 PASSWORD = os.getenv("PASSWORD")
 URI = os.getenv("URI")
 DB_NAME = os.getenv("DB_NAME")
+CSV_URL = os.getenv("CSV_URL") #Optional, URL of data/clean files readable by Neo4j server (e.g. file:///)
 
 #Files with cleaned data for movie database
 DATA_PATH = '../../data/clean/'
@@ -31,11 +33,15 @@ if __name__ == "__main__":
     #############################
     #Creating database if needed#
     #############################
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-    db = Neo4jDB(URI, USER, PASSWORD, DB_NAME, files_names)
-    db.create_db()
-    db.create_embeddings("Movie", "overview", embedding_model, True)
-    db.create_embedding_index("Movie", "overview_embedding", "OVERVIEW_INDEX", 768)
-    db.create_node_info("Movie", "movie_info", embedding_model, update=True)
-    db.create_embedding_index("Movie", "movie_info_embedding", "MOVIE_INFO_INDEX", 768)
+    embedding_model = HuggingFaceEmbeddings(
+        model_name="sentence-transformers/all-mpnet-base-v2",
+        model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"},
+        encode_kwargs={"batch_size": 128, "normalize_embeddings": True}
+    )
+    with Neo4jDB(URI, USER, PASSWORD, DB_NAME, files_names, CSV_URL) as db:
+        db.create_db()
+        db.create_embeddings("Movie", "overview", embedding_model, True)
+        db.create_embedding_index("Movie", "overview_embedding", "OVERVIEW_INDEX", 768)
+        db.create_node_info("Movie", "movie_info", embedding_model, update=True)
+        db.create_embedding_index("Movie", "movie_info_embedding", "MOVIE_INFO_INDEX", 768)
     print("Database created successfully")
\ No newline at end of file
@@ -0,0 +1,65 @@
+from huggingface_hub import AsyncInferenceClient
+import aiohttp
+
+#Async HuggingFace inference client that keeps connections alive between calls
+#AsyncInferenceClient opens a new aiohttp session for every request, here all sessions share one connection pool,
+#so TCP/TLS connections to the inference endpoint are reused instead of being opened for every call
+class KeepAliveInferenceClient(AsyncInferenceClient):
+
+    #Initialization of the client
+    #Arguments:
+    # *args, **kwargs - Arguments of AsyncInferenceClient
+    # max_connections:int - Maximum number of open connections in the pool
+    #Returns: None
+    def __init__(self, *args, max_connections:int = 32, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._max_connections = max_connections
+        self._connector = None
+
+    #Create aiohttp session using shared connection pool
+    #Sessions are registered and closed the same way as in AsyncInferenceClient, closing a session keeps the pool open
+    #Arguments:
+    # headers:dict - Optional additional headers for the session
+    #Returns: aiohttp.ClientSession - New session
+    def _get_client_session(self, headers:dict = None):
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(limit=self._max_connections, keepalive_timeout=60)
+        client_headers = self.headers.copy()
+        if headers is not None:
+            client_headers.update(headers)
+        session = aiohttp.ClientSession(
+            connector=self._connector,
+            connector_owner=False,
+            headers=client_headers,
+            cookies=self.cookies,
+            timeout=aiohttp.ClientTimeout(self.timeout),
+            trust_env=self.trust_env,
+        )
+        self._sessions[session] = set()
+
+        #Register responses, so they can be closed with session
+        wrapped_request = session._request
+        async def request(method, url, **kwargs):
+            response = await wrapped_request(method, url, **kwargs)
+            self._sessions[session].add(response)
+            return response
+        session._request = request
+
+        #Close ongoing responses and deregister session when it is closed
+        wrapped_close = session.close
+        async def close_session():
+            for response in self._sessions[session]:
+                response.close()
+            await wrapped_close()
+            self._sessions.pop(session, None)
+        session.close = close_session
+        return session
+
+    #Close all open sessions and the shared connection pool
+    #Arguments: None
+    #Returns: None
+    async def close(self):
+        await super().close()
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
@@ -1,6 +1,95 @@
 from neo4j import GraphDatabase
+import neo4j
+import numpy as np
 import pandas as pd
 from langchain_huggingface import HuggingFaceEmbeddings
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+import threading
+import queue
+import os
+import re
+
+#Movie properties loaded from movies file (release_date is converted to date separately)
+MOVIE_PROPERTIES = ['title', 'original_title', 'overview', 'budget', 'popularity', 'revenue', 'runtime', 'vote_average', 'vote_count']
+#Numeric columns of CSV files, LOAD CSV returns all values as strings (columns "id" and "*_id" are integers too)
+CSV_INTEGER_COLUMNS = {'budget', 'revenue', 'vote_count'}
+CSV_FLOAT_COLUMNS = {'popularity', 'runtime', 'vote_average'}
+#Time in seconds for which managed transactions are retried (e.g. after deadlock of concurrent loads)
+MAX_TRANSACTION_RETRY_TIME = 120
+#Unique constraints (label, property) of node ids, their indexes are used by MERGE during import
+SCHEMA_CONSTRAINTS = [
+    ('Movie', 'id'), ('Person', 'person_id'), ('Genre', 'genre_id'), ('Keyword', 'keyword_id'),
+    ('Collection', 'collection_id'), ('ProductionCompany', 'company_id'), ('ProductionCountry', 'country_code'),
+    ('SpokenLanguage', 'language_code')
+]
+#Secondary indexes (label, property) used by chatbot queries, created after import
+SCHEMA_INDEXES = [('Movie', 'title'), ('Person', 'name')]
+
+#Labels, properties and index names inserted into query text, parameters cannot be used for them
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+#Check if names can be safely inserted into query text
+#Arguments:
+# *names:str - Labels, properties or index names
+#Returns: None
+#Raises: ValueError if any name is not a valid identifier
+def check_identifiers(*names:str):
+    for name in names:
+        if not isinstance(name, str) or not IDENTIFIER.fullmatch(name):
+            raise ValueError(f"Invalid label, property or index name: {name!r}")
+
+#Neo4j driver accepts numpy arrays as query parameters since version 5.0
+NUMPY_PARAMETERS = int(neo4j.__version__.split(".")[0]) >= 5
+
+#Convert embeddings to float32 vectors used as query parameters
+#Arguments:
+# embeddings:list[list[float]] - Embeddings returned by embedding model
+#Returns: list - float32 numpy arrays, or lists of floats if driver does not accept numpy parameters
+def to_vectors(embeddings):
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    return list(vectors) if NUMPY_PARAMETERS else vectors.tolist()
+
+#Iterate over items produced in background thread, so producing next item overlaps with processing current one
+#Arguments:
+# iterable:iterable - Items to produce (e.g. batches with computed embeddings)
+# maxsize:int - Maximum number of produced items waiting for processing
+#Returns: Generator of items from iterable
+#Raises: Exception raised by iterable in producer thread
+def prefetch(iterable, maxsize:int = 2):
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    end = object()
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                put((item, None))
+            put((end, None))
+        except Exception as error:
+            put((end, error))
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stop.set()
 
 #Class for Neo4j database with information about movies and their related data
 class Neo4jDB:
@@ -12,86 +101,320 @@ class Neo4jDB:
     # password:str - Password for Neo4j
     # db_name:str - Database name to connect
     # files_names:dict - Dictionary with file names for loading data (movies, actors, genres, etc.)
+    # csv_url:str - Optional base URL of the same files readable by Neo4j server (e.g. file:/// for import directory),
+    #               if provided data is loaded by server with LOAD CSV instead of sending it from pandas
+    # driver:neo4j.Driver - Optional existing driver to reuse its connection pool, uri, user and password are then ignored
+    #                       and the driver is not closed on exit
     #Returns: None
-    def __init__(self, uri:str, user:str, password:str, db_name:str, files_names:dict):
-        self._driver = GraphDatabase.driver(uri, auth=(user, password))
+    def __init__(self, uri:str, user:str, password:str, db_name:str, files_names:dict, csv_url:str = None, driver = None):
+        self._owns_driver = driver is None
+        self._driver = GraphDatabase.driver(
+            uri, auth=(user, password), max_transaction_retry_time=MAX_TRANSACTION_RETRY_TIME
+        ) if driver is None else driver
         self._db_name = db_name
         self._files_names = files_names
+        self._csv_url = csv_url
+        self._applied_schema = set() #Constraints and indexes already created by this instance
     
-    #Destructor of the class, closes the connection
+    #Enter context of the class
     #Arguments: None
+    #Returns: Neo4jDB - The instance itself
+    def __enter__(self):
+        return self
+    
+    #Exit context of the class, closes the connection if driver was created by the instance
+    #Arguments:
+    # *exc - Exception information, exceptions are not suppressed
     #Returns: None
-    def __del__(self):
-        self._driver.close()
+    def __exit__(self, *exc):
+        if self._owns_driver:
+            self._driver.close()
 
     #Function to execute a query in the database
     #Arguments:
     # query:str - Cypher query string
     # parameters:dict - Optional dictionary of parameters for the query
-    #Returns: List of dictionaries with query results
-    def execute_query(self, query:str, parameters:dict = None):
+    # fetch:bool - If False, records are not fetched (e.g. for writes) and only the summary is returned
+    #Returns: List of dictionaries with query results or ResultSummary if fetch is False
+    def execute_query(self, query:str, parameters:dict = None, fetch:bool = True):
+        with self._driver.session(database=self._db_name) as session:
+            result = session.run(query, parameters or {})
+            return result.data() if fetch else result.consume()
+    
+    #Context manager with single session used for many queries
+    #Arguments: None
+    #Returns: Session to the database, closed on exit
+    @contextmanager
+    def session_scope(self):
         with self._driver.session(database=self._db_name) as session:
-            return session.run(query, parameters or {}).data()
+            yield session
+    
+    #Function to execute write query for each batch of data in single session
+    #Each batch is written in its own transaction, results are discarded on server
+    #Arguments:
+    # query:str - Cypher query string using $data parameter
+    # batches:iterable - Iterable of lists with rows for $data parameter
+    #Returns: None
+    def _run_batches(self, query:str, batches):
+        with self.session_scope() as session:
+            for batch in batches:
+                session.execute_write(lambda tx: tx.run(query, data=batch).consume())
+    
+    #Function to create all constraints and indexes in single transaction
+    #Constraints and indexes already created by this instance are skipped
+    #Arguments:
+    # constraints:list[tuple] - Pairs of node label and property for unique constraints
+    # indexes:list[tuple] - Pairs of node label and property for indexes
+    #Returns: None
+    #Raises: ValueError if label or property is not a valid identifier
+    def apply_schema(self, constraints:list, indexes:list):
+        for label, property in constraints + indexes:
+            check_identifiers(label, property)
+        constraints = [pair for pair in constraints if ('constraint',) + tuple(pair) not in self._applied_schema]
+        indexes = [pair for pair in indexes if ('index',) + tuple(pair) not in self._applied_schema]
+        if not constraints and not indexes:
+            return
+        def write_schema(tx):
+            for label, property in constraints:
+                tx.run(f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.{property} IS UNIQUE").consume()
+            for label, property in indexes:
+                tx.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.{property})").consume()
+        with self.session_scope() as session:
+            session.execute_write(write_schema)
+        self._applied_schema.update(('constraint',) + tuple(pair) for pair in constraints)
+        self._applied_schema.update(('index',) + tuple(pair) for pair in indexes)
+    
+    #Estimate number of rows in batch, so single transaction carries about target_bytes of data
+    #Server side state of MERGE transaction grows much faster than its payload, so batch is also capped by max_size
+    #Arguments:
+    # sample_rows:list[dict] - Rows representative for the batch, the largest one is used for estimation
+    # target_bytes:int - Target size of batch in bytes
+    # min_size:int - Minimal number of rows in batch
+    # max_size:int - Maximal number of rows in batch
+    #Returns: int - Number of rows in batch
+    @staticmethod
+    def _adaptive_batch_size(sample_rows:list, target_bytes:int = 16*1024*1024, min_size:int = 100, max_size:int = 20000):
+        #Vectors are sent as 9 bytes per element (marker and float64), other values are estimated from their text form
+        row_bytes = max((sum(len(key) + (value.size * 9 if isinstance(value, np.ndarray) else len(repr(value)))
+                             for key, value in row.items()) for row in sample_rows), default=1)
+        return min(max_size, max(min_size, target_bytes // max(row_bytes, 1)))
+    
+    #Read CSV file in chunks, so only one batch of rows is kept in memory
+    #Arguments:
+    # file_key:str - Key in files_names dictionary for the file
+    # batch_size:int - Optional number of rows in single batch, estimated from the first rows of the file if not provided
+    # id_columns:list - Optional columns with ids, rows missing any of them are skipped and numeric ids are cast to integers
+    #Returns: Generator of DataFrames with rows of the file, dates are strings
+    def _read_csv_chunks(self, file_key:str, batch_size:int = None, id_columns:list = None):
+        if batch_size is None:
+            sample = self._to_records(pd.read_csv(self._files_names[file_key], nrows=100))
+            batch_size = self._adaptive_batch_size(sample) if sample else 10000
+            print(f"Batch size for {file_key} data = {batch_size}")
+        for df in pd.read_csv(self._files_names[file_key], chunksize=batch_size):
+            if id_columns:
+                df = df.dropna(subset=id_columns)
+                for column in id_columns:
+                    if pd.api.types.is_numeric_dtype(df[column]):
+                        df[column] = df[column].astype('Int64')
+            for column in df.columns:
+                if pd.api.types.is_datetime64_any_dtype(df[column]):
+                    df[column] = df[column].dt.strftime("%Y-%m-%d")
+            yield df
+    
+    #Convert DataFrame to rows for query parameters
+    #Arguments:
+    # df:pd.DataFrame - Rows to convert
+    #Returns: list[dict] - Rows as dictionaries, missing values are None
+    @staticmethod
+    def _to_records(df:pd.DataFrame):
+        return df.astype(object).where(df.notna(), None).to_dict('records')
     
     #Function to check if constraints exist and create them if not
     #Arguments:
     # label:str - Node label
     # property:str - Property for which the constraint should be applied
     #Returns: None
+    #Raises: ValueError if label or property is not a valid identifier
     def check_constraints(self, label:str, property:str):
+        check_identifiers(label, property)
         query = f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.{property} IS UNIQUE"
-        self.execute_query(query, parameters={'label': label, 'property': property})
+        self.execute_query(query, parameters=None, fetch=False)
         
     #Function to create index if it does not exist
     #Arguments:
     # label:str - Node label
     # property:str - Property for which the index should be created
     #Returns: None
+    #Raises: ValueError if label or property is not a valid identifier
     def create_index(self, label:str, property:str):
+        check_identifiers(label, property)
         query = f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.{property})"
-        self.execute_query(query, parameters={'label': label, 'property': property})
+        self.execute_query(query, parameters=None, fetch=False)
+    
+    #Cypher expression reading column value from row
+    #Arguments:
+    # column:str - Column name
+    # csv:bool - True if row comes from LOAD CSV, then numeric columns are converted from strings
+    #Returns: str - Cypher expression
+    @staticmethod
+    def _row_value(column:str, csv:bool = False):
+        if not csv:
+            return f"row.{column}"
+        if column == "id" or column.endswith("_id") or column in CSV_INTEGER_COLUMNS:
+            return f"toInteger(toFloat(row.{column}))"
+        if column in CSV_FLOAT_COLUMNS:
+            return f"toFloat(row.{column})"
+        return f"row.{column}"
+    
+    #URL of file for LOAD CSV
+    #Arguments:
+    # file_key:str - Key in files_names dictionary for the file
+    #Returns: str - URL of the file readable by Neo4j server
+    def _csv_file_url(self, file_key:str):
+        return self._csv_url.rstrip("/") + "/" + os.path.basename(self._files_names[file_key])
     
-    #Create movie nodes with properties
+    #Create query merging movie nodes with properties from rows
+    #Arguments:
+    # csv:bool - True if rows come from LOAD CSV
+    #Returns: str - Cypher fragment for single row
+    def _movie_merge_query(self, csv:bool = False):
+        query = f"""
+            MERGE (m:Movie {{id: {self._row_value('id', csv)}}})
+            ON CREATE SET 
+                m.release_date = CASE 
+                                 WHEN row.release_date IS NOT NULL AND row.release_date <> '' 
+                                 THEN date(row.release_date) 
+                                 ELSE NULL 
+                                 END"""
+        for prop in MOVIE_PROPERTIES:
+            query += f",\n                m.{prop} = {self._row_value(prop, csv)}"
+        return query + "\n"
+    
+    #Create movie nodes with properties, unique constraint on movie id is created first if needed
     #Arguments: None
     #Returns: None
     #Raises: ValueError if movies file not provided
     def create_movie(self):
         if("movies" not in self._files_names):
             raise ValueError("Movies file name not provided in files_names dictionary")
+        self.apply_schema([('Movie', 'id')], [])
+        if self._csv_url:
+            print(f"Loading movies data from ${self._csv_file_url('movies')} file on server...")
+            #Movies are independent nodes, so batches can be written concurrently (IN CONCURRENT TRANSACTIONS needs Neo4j 5.21+)
+            query = f"""
+            LOAD CSV WITH HEADERS FROM $url AS row
+            WITH row WHERE row.id IS NOT NULL
+            CALL {{
+            WITH row
+            {self._movie_merge_query(csv=True)}
+            }} IN CONCURRENT TRANSACTIONS OF 10000 ROWS
+            """
+            self.execute_query(query, parameters={'url': self._csv_file_url('movies')}, fetch=False)
+            print("Movies data loaded successfully.")
         else:
-            self.check_constraints("Movie", "id")
             print(f"Loading movies data from ${self._files_names['movies']} file...")
-            movies_df = pd.read_csv(self._files_names['movies'])
-            if pd.api.types.is_datetime64_any_dtype(movies_df['release_date']):
-                movies_df['release_date'] = movies_df['release_date'].dt.strftime("%Y-%m-%d")
-            movies_data = movies_df.to_dict('records')
-            for row in movies_data:
-                for key, value in row.items():
-                    if isinstance(value, float) and pd.isna(value):
-                        row[key] = None
-            query = """
-            UNWIND $movies AS movie
-            MERGE (m:Movie {id: movie.id})
-            ON CREATE SET 
-                m.title          = movie.title,
-                m.original_title = movie.original_title,
-                m.overview       = movie.overview,
-                m.release_date   = CASE 
-                                    WHEN movie.release_date IS NOT NULL AND movie.release_date <> '' 
-                                    THEN date(movie.release_date) 
-                                    ELSE NULL 
-                                    END,
-                m.budget         = movie.budget,
-                m.popularity     = movie.popularity,
-                m.revenue        = movie.revenue,
-                m.runtime        = movie.runtime,
-                m.vote_average   = movie.vote_average,
-                m.vote_count     = movie.vote_count
-            """
-            self.execute_query(query, parameters={'movies': movies_data})
+            query = "UNWIND $data AS row" + self._movie_merge_query()
+            self._run_batches(query, (self._to_records(df) for df in self._read_csv_chunks('movies', id_columns=['id'])))
             print("Movies data loaded successfully.")
     
+    #Create query merging node with its properties and labels from single row
+    #Queries are cached, so loads sharing the node label (actors, directors, crew) reuse the same query text
+    #Arguments:
+    # node_label:str - Label of the node to be created
+    # node_id_column:str - Node property used as node id
+    # node_properties:tuple - Pairs of node property name and CSV column
+    # additional_labels:tuple - Optional additional labels for the node
+    # csv:bool - True if rows come from LOAD CSV
+    #Returns: str - Cypher fragment for single row
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _build_node_query(node_label:str, node_id_column:str, node_properties:tuple, additional_labels:tuple = None,
+                          csv:bool = False):
+        node_properties = dict(node_properties)
+        query = f"""
+            MERGE (n:{node_label} {{{node_id_column}: {Neo4jDB._row_value(node_properties[node_id_column], csv)}}})
+            """
+        if len(node_properties) > 1 or additional_labels:
+            query += "ON CREATE SET\n"
+        if len(node_properties) > 1:
+            for k, v in node_properties.items():
+                if k != node_id_column:
+                    query += f"    n.{k} = {Neo4jDB._row_value(v, csv)},\n"
+            if not additional_labels:
+                query = query.rstrip(',\n') + "\n"
+        if additional_labels:
+            for al in additional_labels:
+                query += f"    n:{al},\n"
+            query = query.rstrip(',\n') + "\n"
+            query += "ON MATCH SET\n"
+            for al in additional_labels:
+                query += f"    n:{al},\n"
+            query = query.rstrip(',\n') + "\n"
+        return query
+
+    #Create query merging relationship between node and movie from single row
+    #Arguments:
+    # node_label:str - Label of the node
+    # node_id_column:str - Node property used as node id
+    # node_id_csv_column:str - Column in CSV containing node id
+    # movie_id_column:str - Column in CSV containing related movie id
+    # rel_label:str - Label of the relationship to the movie
+    # rel_properties:tuple - Optional pairs of relationship property name and CSV column
+    # csv:bool - True if rows come from LOAD CSV
+    # match_node:bool - If False, node n has to be already bound by preceding part of the query
+    #Returns: str - Cypher fragment for rows of the batch (match_node) or for single row
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _build_rel_query(node_label:str, node_id_column:str, node_id_csv_column:str, movie_id_column:str, rel_label:str,
+                         rel_properties:tuple = None, csv:bool = False, match_node:bool = True):
+        if match_node:
+            #Rows are grouped by movie, so each movie is matched once per batch
+            query = f"""
+            WITH {Neo4jDB._row_value(movie_id_column, csv)} AS movie_id, collect(row) AS rows
+            ORDER BY movie_id
+            MATCH (m:Movie {{id: movie_id}})
+            UNWIND rows AS row
+            MATCH (n:{node_label} {{{node_id_column}: {Neo4jDB._row_value(node_id_csv_column, csv)}}})
+            MERGE (n)-[r:{rel_label}]->(m)
+            """
+        else:
+            query = f"""WITH n, row
+            MATCH (m:Movie {{id: {Neo4jDB._row_value(movie_id_column, csv)}}})
+            MERGE (n)-[r:{rel_label}]->(m)
+            """
+        if rel_properties:
+            query += "SET\n"
+            for k, v in rel_properties:
+                query += f"    r.{k} = {Neo4jDB._row_value(v, csv)},\n"
+            query = query.rstrip(',\n') + "\n"
+        return query
+
+    #Merge nodes from rows in single transaction
+    #Arguments:
+    # session:Session - Session used for the write
+    # node_key:tuple - Arguments of _build_node_query
+    # df:pd.DataFrame - Rows with node properties, each node should be in one row only
+    #Returns: None
+    def _upsert_nodes(self, session, node_key:tuple, df:pd.DataFrame):
+        if not df.empty:
+            query = "UNWIND $data AS row" + self._build_node_query(*node_key)
+            data = self._to_records(df)
+            session.execute_write(lambda tx: tx.run(query, data=data).consume())
+
+    #Merge relationships between existing nodes and movies from rows in single transaction
+    #Arguments:
+    # session:Session - Session used for the write
+    # rel_key:tuple - Arguments of _build_rel_query
+    # df:pd.DataFrame - Rows with node id, movie id and relationship properties
+    #Returns: None
+    def _upsert_rels(self, session, rel_key:tuple, df:pd.DataFrame):
+        if not df.empty:
+            query = "UNWIND $data AS row" + self._build_rel_query(*rel_key)
+            data = self._to_records(df)
+            session.execute_write(lambda tx: tx.run(query, data=data).consume())
+    
     #Base function to create nodes and relationships for movies
+    #Unique constraint on node id is created first if needed, movies have to be already loaded
     #Arguments:
     # file_key:str - Key in files_names dictionary for the file
     # node_label:str - Label of the node to be created
@@ -107,48 +430,41 @@ class Neo4jDB:
                                 node_properties:dict, rel_label:str, additional_labels:list = None, rel_properties:dict = None):
         if (file_key not in self._files_names):
             raise ValueError(f"{file_key} file name not provided in files_names dictionary")
-        else:
-            self.check_constraints(node_label, node_id_column)
-            print(f"Loading {file_key} data from ${self._files_names[file_key]} file...")
-            df = pd.read_csv(self._files_names[file_key])
-            data = df.to_dict('records')
-            for row in data:
-                for key, value in row.items():
-                    if isinstance(value, float) and pd.isna(value):
-                        row[key] = None
+        self.apply_schema([(node_label, node_id_column)], [])
+        id_column = node_properties[node_id_column]
+        node_key = (node_label, node_id_column, tuple(node_properties.items()),
+                    tuple(additional_labels) if additional_labels else None)
+        rel_key = (node_label, node_id_column, id_column, movie_id_column, rel_label,
+                   tuple(rel_properties.items()) if rel_properties else None)
+        if self._csv_url:
+            print(f"Loading {file_key} data from ${self._csv_file_url(file_key)} file on server...")
+            #Rows share nodes (e.g. the same person in many movies), so batches are written one after another
             query = f"""
-            UNWIND $data AS row
-            MERGE (n:{node_label} {{{node_id_column}: row.{node_properties[node_id_column]}}})
+            LOAD CSV WITH HEADERS FROM $url AS row
+            WITH row WHERE row.{id_column} IS NOT NULL AND row.{movie_id_column} IS NOT NULL
+            CALL {{
+            WITH row
+            {self._build_node_query(*node_key, csv=True)}
+            {self._build_rel_query(*rel_key, csv=True, match_node=False)}
+            }} IN TRANSACTIONS OF 10000 ROWS
             """
-            if len(node_properties) > 1 or additional_labels:
-                query += "ON CREATE SET\n"
-            if len(node_properties) > 1:
-                for k, v in node_properties.items():
-                    if k != node_id_column:
-                        query += f"    n.{k} = row.{v},\n"
-                if not additional_labels:
-                    query = query.rstrip(',\n') + "\n"
-            if additional_labels:
-                for al in additional_labels:
-                    query += f"    n:{al},\n"
-                query = query.rstrip(',\n') + "\n"
-                query += "ON MATCH SET\n"
-                for al in additional_labels:
-                    query += f"    n:{al},\n"
-                query = query.rstrip(',\n') + "\n"
-            query += f"""WITH n, row
-            MATCH (m:Movie {{id: row.{movie_id_column}}})
-            MERGE (n)-[r:{rel_label}]->(m)
-            """
-            if rel_properties:
-                query += "SET\n"
-                for k, v in rel_properties.items():
-                    query += f"    r.{k} = row.{v},\n"
-                query = query.rstrip(',\n') + "\n"
-            batch_size = 10000
-            for i in range(0, len(data), batch_size):
-                batch = data[i:i+batch_size]
-                self.execute_query(query, parameters={'data': batch})
+            self.execute_query(query, parameters={'url': self._csv_file_url(file_key)}, fetch=False)
+            print(f"{file_key.capitalize()} data loaded successfully.")
+        else:
+            print(f"Loading {file_key} data from ${self._files_names[file_key]} file...")
+            #Node appears in many rows (e.g. person in many movies), so each node is merged only once
+            #and relationships are merged separately between already existing nodes
+            node_columns = list(dict.fromkeys(node_properties.values()))
+            rel_columns = list(dict.fromkeys([id_column, movie_id_column] + list((rel_properties or {}).values())))
+            merged_ids = set()
+            with self.session_scope() as session:
+                for df in self._read_csv_chunks(file_key, id_columns=[id_column, movie_id_column]):
+                    nodes_df = df[node_columns].drop_duplicates(subset=id_column)
+                    nodes_df = nodes_df[[value not in merged_ids for value in nodes_df[id_column]]]
+                    merged_ids.update(nodes_df[id_column])
+                    self._upsert_nodes(session, node_key, nodes_df)
+                    #Rows of the same movie are next to each other, so the movie node stays in page cache
+                    self._upsert_rels(session, rel_key, df[rel_columns].sort_values(movie_id_column))
             print(f"{file_key.capitalize()} data loaded successfully.")
     
     #Create actors nodes with properties and relationships with movies
@@ -293,28 +609,51 @@ class Neo4jDB:
     # embedding_model:HuggingFaceEmbeddings - Embedding model
     # update:bool - If True, only nodes without embedding will be updated
     #Returns: None
+    #Raises: ValueError if label or property is not a valid identifier
+    #        RuntimeError if any batch of embeddings failed to be written
     def create_embeddings(self, node_label:str, property:str, embedding_model:HuggingFaceEmbeddings = None, update:bool = False):
-        if update:
-            update_str = f"AND n.{property}_embedding IS NULL"
-        else:
-            update_str = ""
-        query = f"""
+        check_identifiers(node_label, property)
+        #Update mode is a parameter, so both modes share the same query text and cached plan
+        read_query = f"""
         MATCH (n:{node_label})
-        WHERE n.{property} IS NOT NULL {update_str}
+        WHERE n.{property} IS NOT NULL AND ($update = false OR n.{property}_embedding IS NULL)
         RETURN n.id AS id, n.{property} AS {property}
         """
-        result = self.execute_query(query, parameters=None)
-        query = f"""
-        UNWIND $data AS row
-        MATCH (n:{node_label} {{id: row.id}})
-        CALL db.create.setNodeVectorProperty(n, '{property}_embedding', row.embedding);
+        #Nodes embeddings are independent writes, so APOC writes inner batches in parallel transactions
+        write_query = f"""
+        CALL apoc.periodic.iterate(
+            'UNWIND $data AS row RETURN row',
+            'MATCH (n:{node_label} {{id: row.id}}) CALL db.create.setNodeVectorProperty(n, "{property}_embedding", row.embedding)',
+            {{batchSize: 1000, parallel: true, concurrency: 8, params: {{data: $data}}}}
+        )
+        YIELD failedBatches, errorMessages
+        RETURN failedBatches, errorMessages
         """
-        batch_size = 100
-        for i in range(0, len(result), batch_size):
-            batch = [{'id': row['id'], 'embedding': embedding_model.embed_query(row[property])} 
-                     for row in result[i:i+batch_size]]
-            self.execute_query(query, parameters={'data': batch})
-            print(f"Number of updated properties = {batch_size+i}")
+        #Embeddings of next batch are computed in background while current batch is written
+        #Nodes are streamed from the read query, so only the current batch is kept in memory
+        #The first batch is small, size of the next batches is estimated from its rows
+        def embedding_batches():
+            with self.session_scope() as read_session:
+                records = read_session.run(read_query, update=update)
+                batch_size, processed = 32, 0
+                while True:
+                    rows = [record.data() for record in islice(records, batch_size)]
+                    if not rows:
+                        break
+                    embeddings = to_vectors(embedding_model.embed_documents([row[property] for row in rows]))
+                    batch = [{'id': row['id'], 'embedding': embedding} for row, embedding in zip(rows, embeddings)]
+                    if processed == 0:
+                        batch_size = self._adaptive_batch_size(batch)
+                        print(f"Batch size for embeddings = {batch_size}")
+                    processed += len(rows)
+                    yield processed, batch
+        with self.session_scope() as session:
+            for updated, batch in prefetch(embedding_batches()):
+                #APOC does not raise on failed inner batches, they are only reported in its result
+                result = session.run(write_query, data=batch).single()
+                if result['failedBatches'] > 0:
+                    raise RuntimeError(f"{result['failedBatches']} batches of embeddings failed to be written: {result['errorMessages']}")
+                print(f"Number of updated properties = {updated}")
         print("Embeddings created successfully")
 
     #Create vector index for a node property
@@ -324,7 +663,9 @@ class Neo4jDB:
     # index_name:str - Name of the index
     # vector_dimension:int - Dimension of embedding vector
     #Returns: None
+    #Raises: ValueError if label, property or index name is not a valid identifier
     def create_embedding_index(self, node_label:str, node_prop:str, index_name:str, vector_dimension:int):
+        check_identifiers(node_label, node_prop, index_name)
         query = f"""
         CREATE VECTOR INDEX {index_name} IF NOT EXISTS
         FOR (n:{node_label})
@@ -334,7 +675,7 @@ class Neo4jDB:
         `vector.similarity_function`: 'cosine'
         }}}}
         """
-        self.execute_query(query, parameters=None)
+        self.execute_query(query, parameters=None, fetch=False)
 
     #Create info property for node based on its properties and neighbours
     #Arguments:
@@ -343,75 +684,75 @@ class Neo4jDB:
     # embedding_model:HuggingFaceEmbeddings - Embedding model
     # update:bool - If True, only nodes without info will be updated
     #Returns: None
+    #Raises: ValueError if label or property name is not a valid identifier
     def create_node_info(self, node_label:str, new_prop_name:str, embedding_model:HuggingFaceEmbeddings = None, update:bool = False):
-        if update:
-            update_str = f"WHERE n.{new_prop_name} IS NULL \n"
-        else:
-            update_str = ""
+        check_identifiers(node_label, new_prop_name)
+        #Update mode is a parameter, so both modes share the same query text and cached plan
+        update_filter = f"WHERE $update = false OR n.{new_prop_name} IS NULL"
         query = f"""
         MATCH (n:{node_label})
-        {update_str} RETURN n.id AS id
+        {update_filter} RETURN count(n) AS count
         """
-        movie_list = self.execute_query(query, parameters=None)
-        movie_ids = [row['id'] for row in movie_list]
-        print(f"{len(movie_ids)} movies to process")
-        batch_size = 10
-        for i in range(0, len(movie_ids), batch_size):
-            query = f"""
-            MATCH (n:{node_label})
-            WHERE n.id IN $id_list
-            OPTIONAL MATCH (n)-[r]-(m)
-            RETURN n, collect({{relType:type(r), relProps:properties(r), neighbour:properties(m)}}) AS relData
-            """
-            movies_info = self.execute_query(query, parameters={'id_list': movie_ids[i:i+batch_size]})
-            movies_info_restructures = []
-            for movie in movies_info:
-                movie_node = movie['n']
-                movie_id = movie_node['id']
-                movie_node_str = "Movie Info "
-                for prop, value in movie_node.items():
-                    if 'id' not in prop and 'embedding' not in prop:
-                        movie_node_str += (prop + ": " + str(value) + ", ")
-                movie_node_str = movie_node_str.rstrip(", ") + " "
-                neighbours = movie['relData']
-                neighbours_str = "|| ADDITIONAL DATA | "
-                for neighbour in neighbours:
-                    neighbour_str = str(neighbour['relType']) + " "
-                    neighbour_props = neighbour['neighbour']
-                    if neighbour_props:
-                        for prop, value in neighbour_props.items():
-                            if 'id' not in prop and 'embedding' not in prop:
-                                neighbour_str += ((prop + ": " + str(value) + ", "))
-                    rel_props = neighbour['relProps']
-                    if rel_props:
-                        for prop, value in rel_props.items():
-                            if 'id' not in prop and 'embedding' not in prop:
-                                neighbour_str += ((prop + ": " + str(value) + ", "))
-                    neighbour_str = neighbour_str.rstrip(", ") + " | "
-                    neighbours_str += neighbour_str
-                neighbours_str = neighbours_str.rstrip("| ") + "||"
-                movie_info = movie_node_str+neighbours_str
-                movies_info_restructures.append({'id': movie_id, 'movie_info': movie_info, 'embedding': embedding_model.embed_query(movie_info) })
-            query = f""" 
-            UNWIND $data AS row
-            MATCH (n:{node_label} {{id: row.id}})
-            SET n.{new_prop_name} = row.movie_info,
-                n.{new_prop_name}_embedding = row.embedding
-            """
-            self.execute_query(query, parameters={'data': movies_info_restructures})
-            print(f"Number of updated properties = {batch_size+i}")
+        print(f"{self.execute_query(query, parameters={'update': update})[0]['count']} movies to process")
+        #Properties of node or relationship as "name: value" fragments, ids and embeddings are skipped
+        def info_fragments(properties):
+            if not properties:
+                return []
+            return [f"{prop}: {value}" for prop, value in properties.items() if 'id' not in prop and 'embedding' not in prop]
+        #Info strings and embeddings of next batch are prepared in background while current batch is written
+        #Nodes are streamed from one driving query, so only the current batch is kept in memory
+        def info_batches():
+            with self.session_scope() as read_session:
+                read_query = f"""
+                MATCH (n:{node_label})
+                {update_filter} OPTIONAL MATCH (n)-[r]-(m)
+                RETURN n, collect({{relType:type(r), relProps:properties(r), neighbour:properties(m)}}) AS relData
+                """
+                records = read_session.run(read_query, update=update)
+                #The first batch is small, size of the next batches is estimated from its rows
+                batch_size, processed = 32, 0
+                while True:
+                    movies_info = [record.data() for record in islice(records, batch_size)]
+                    if not movies_info:
+                        break
+                    movies_info_restructures = []
+                    for movie in movies_info:
+                        movie_node = movie['n']
+                        movie_node_str = "Movie Info " + ", ".join(info_fragments(movie_node)) + " "
+                        neighbour_strs = []
+                        for neighbour in movie['relData']:
+                            fragments = info_fragments(neighbour['neighbour']) + info_fragments(neighbour['relProps'])
+                            neighbour_strs.append((f"{neighbour['relType']} " + ", ".join(fragments)).rstrip())
+                        neighbours_str = ("|| ADDITIONAL DATA | " + " | ".join(neighbour_strs)).rstrip("| ") + "||"
+                        movies_info_restructures.append({'id': movie_node['id'], 'movie_info': movie_node_str+neighbours_str})
+                    embeddings = to_vectors(embedding_model.embed_documents([row['movie_info'] for row in movies_info_restructures]))
+                    for row, embedding in zip(movies_info_restructures, embeddings):
+                        row['embedding'] = embedding
+                    if processed == 0:
+                        batch_size = self._adaptive_batch_size(movies_info_restructures)
+                        print(f"Batch size for {new_prop_name} = {batch_size}")
+                    processed += len(movies_info)
+                    yield processed, movies_info_restructures
+        write_query = f"""
+        UNWIND $data AS row
+        MATCH (n:{node_label} {{id: row.id}})
+        SET n.{new_prop_name} = row.movie_info
+        WITH n, row
+        CALL db.create.setNodeVectorProperty(n, "{new_prop_name}_embedding", row.embedding)
+        """
+        with self.session_scope() as session:
+            for processed, movies_info_restructures in prefetch(info_batches()):
+                session.execute_write(lambda tx: tx.run(write_query, data=movies_info_restructures).consume())
+                print(f"Number of updated properties = {processed}")
 
     #Create all nodes, relationships, indexes and constraints in the database
     #Arguments: None
     #Returns: None
     def create_db(self):
-        self.create_movie()
-        print("\n")
-        self.create_index("Movie", "id")
-        print("Index on movie id created successfully.")
+        self.apply_schema(SCHEMA_CONSTRAINTS, [])
+        print("Constraints created successfully.")
         print("\n")
-        self.create_index("Movie", "title")
-        print("Index on movie title created successfully.")
+        self.create_movie()
         print("\n")
         self.create_actors()
         print("\n")
@@ -419,20 +760,21 @@ class Neo4jDB:
         print("\n")
         self.create_crew()
         print("\n")
-        self.create_index("Person", "name")
-        print("Index on person name created successfully.")
-        print("\n")
-        self.create_genres()
-        print("\n")
-        self.create_keywords()
-        print("\n")
-        self.create_collections()
-        print("\n")
-        self.create_production_companies()
-        print("\n")
-        self.create_production_countries()
+        #Remaining nodes have different labels, so they are loaded concurrently with separate sessions
+        #Movies are locked in id order within each batch and batches are capped, so conflicting writes on shared movie nodes
+        #are retried by managed transactions within MAX_TRANSACTION_RETRY_TIME, phases run serially if retries are not known
+        #to be configured (driver passed from outside) or not available (LOAD CSV)
+        phases = [self.create_genres, self.create_keywords, self.create_collections,
+                  self.create_production_companies, self.create_production_countries, self.create_spoken_languages]
+        concurrent = self._owns_driver and not self._csv_url
+        with ThreadPoolExecutor(max_workers=len(phases) if concurrent else 1) as executor:
+            futures = [executor.submit(phase) for phase in phases]
+            for future in futures:
+                future.result()
         print("\n")
-        self.create_spoken_languages()
+        #Secondary indexes are built once after import, so they are not maintained on every write during load
+        self.apply_schema([], SCHEMA_INDEXES)
+        print("Secondary indexes created successfully.")
         print("\n Data import completed successfully.")
 
 
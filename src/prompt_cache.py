@@ -0,0 +1,112 @@
+from langchain_huggingface import HuggingFaceEmbeddings
+from collections import OrderedDict
+import numpy as np
+import hashlib
+
+#Class for caching LLM responses, first by exact prompt match, then by semantic similarity of a key text
+#Responses are stored in separate namespaces (e.g. cypher generation)
+class PromptCache:
+
+    #Initialization of the cache
+    #Arguments:
+    # embedding_model:HuggingFaceEmbeddings - Embedding model used for semantic matching
+    # threshold:float - Minimal cosine similarity for a semantic hit
+    # max_size:int - Maximum number of exact and semantic entries in each namespace, the oldest are replaced first
+    # block_size:int - Number of rows added to embeddings matrix when it is full
+    #Returns: None
+    def __init__(self, embedding_model:HuggingFaceEmbeddings, threshold:float = 0.95, max_size:int = 1024, block_size:int = 64):
+        self._embedding_model = embedding_model
+        self._threshold = threshold
+        self._max_size = max_size
+        self._block_size = block_size
+        self._exact = {}       #namespace -> OrderedDict {prompt hash: response}, least recently used first
+        self._embeddings = {}  #namespace -> preallocated matrix of normalized key embeddings, rows after responses are unused
+        self._responses = {}   #namespace -> list of responses aligned with embeddings rows
+        self._inserted = {}    #namespace -> number of inserted embeddings, when full the oldest row is inserted % max_size
+
+    #Create hash of the prompt pair used as exact cache key
+    #Arguments:
+    # system_prompt:str - System message
+    # user_prompt:str - User message
+    #Returns: str - sha256 hex digest
+    def _hash(self, system_prompt:str, user_prompt:str):
+        return hashlib.sha256((system_prompt + "\0" + user_prompt).encode("utf-8")).hexdigest()
+
+    #Embed key text into normalized vector, computed once and passed to both get and put
+    #Arguments:
+    # text:str - Text to embed
+    #Returns: np.ndarray - Normalized embedding
+    def embed(self, text:str):
+        vector = np.asarray(self._embedding_model.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    #Get cached response
+    #Arguments:
+    # namespace:str - Cache namespace
+    # system_prompt:str - System message
+    # user_prompt:str - User message
+    # semantic_vector:np.ndarray - Optional embedding of key text (from embed) used when exact match is missing
+    #Returns: str|None - Cached response or None if not found
+    def get(self, namespace:str, system_prompt:str, user_prompt:str, semantic_vector:np.ndarray = None):
+        exact = self._exact.get(namespace, {})
+        key = self._hash(system_prompt, user_prompt)
+        response = exact.get(key)
+        if response is not None:
+            exact.move_to_end(key)
+            return response
+        if semantic_vector is None or namespace not in self._embeddings:
+            return None
+        similarities = self._embeddings[namespace][:len(self._responses[namespace])] @ semantic_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self._threshold:
+            return self._responses[namespace][best]
+        return None
+
+    #Store response in cache
+    #Arguments:
+    # namespace:str - Cache namespace
+    # system_prompt:str - System message
+    # user_prompt:str - User message
+    # response:str - Response to store
+    # semantic_vector:np.ndarray - Optional embedding of key text (from embed) used for similarity lookup
+    #Returns: None
+    def put(self, namespace:str, system_prompt:str, user_prompt:str, response:str, semantic_vector:np.ndarray = None):
+        exact = self._exact.setdefault(namespace, OrderedDict())
+        key = self._hash(system_prompt, user_prompt)
+        exact[key] = response
+        exact.move_to_end(key)
+        if len(exact) > self._max_size:
+            exact.popitem(last=False)
+        if semantic_vector is not None:
+            matrix = self._embeddings.get(namespace)
+            responses = self._responses.setdefault(namespace, [])
+            if len(responses) < self._max_size:
+                #Matrix grows by whole blocks, so rows are not copied on every insert
+                if matrix is None or len(responses) == matrix.shape[0]:
+                    grown = np.zeros((min(self._max_size, len(responses) + self._block_size), semantic_vector.shape[0]), dtype=np.float32)
+                    if matrix is not None:
+                        grown[:len(responses)] = matrix
+                    self._embeddings[namespace] = matrix = grown
+                row = len(responses)
+                responses.append(response)
+            else:
+                row = self._inserted[namespace] % self._max_size
+                responses[row] = response
+            matrix[row] = semantic_vector
+            self._inserted[namespace] = self._inserted.get(namespace, 0) + 1
+
+    #Remove cached responses
+    #Arguments:
+    # namespace:str - Namespace to clear, if None whole cache is cleared
+    #Returns: None
+    def clear(self, namespace:str = None):
+        if namespace is None:
+            self._exact = {}
+            self._embeddings = {}
+            self._responses = {}
+            self._inserted = {}
+        else:
+            self._exact.pop(namespace, None)
+            self._embeddings.pop(namespace, None)
+            self._responses.pop(namespace, None)
+            self._inserted.pop(namespace, None)
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+import re
+
+#Class for caching Cypher queries of structurally similar questions (e.g. "Who directed {movie}?")
+#Question template is created by replacing values of query parameters found in the question with slots,
+#new question matching the template reuses the cached query with values taken from the new question
+class TemplateCache:
+
+    #Initialization of the cache
+    #Arguments:
+    # max_size:int - Maximum number of stored templates, the oldest are removed first
+    # min_static_words:int - Minimal number of words outside slots required to create template
+    # min_slot_length:int - Minimal length of parameter value replaced by slot, shorter values match too many words
+    #Returns: None
+    def __init__(self, max_size:int = 256, min_static_words:int = 2, min_slot_length:int = 3):
+        self._max_size = max_size
+        self._min_static_words = min_static_words
+        self._min_slot_length = min_slot_length
+        self._templates = OrderedDict() #question pattern -> (cypher template, list of (parameter name, lowercase flag))
+
+    #Create template from answered question and parameterized Cypher query used to answer it
+    #Arguments:
+    # question:str - User question
+    # cypher_template:str - Cypher query with string literals replaced by parameters
+    # params:dict[str,str] - Parameters of the query
+    #Returns: bool - True if template was created
+    def add(self, question:str, cypher_template:str, params:dict[str, str]):
+        question = question.strip()
+        slots = []
+        for name, value in params.items():
+            if len(value) < self._min_slot_length:
+                return False
+            #Value has to be whole words of the question, not part of a longer word
+            found = re.search(rf"(?<!\w){re.escape(value)}(?!\w)", question, flags=re.IGNORECASE)
+            if found is None:
+                return False
+            slots.append((found.start(), found.end(), name, value == value.lower()))
+        slots.sort()
+        if len(slots) == 0 or any(slots[i][1] > slots[i+1][0] for i in range(len(slots) - 1)):
+            return False
+        pattern_parts, static_text, position = [], "", 0
+        for start, end, _, _ in slots:
+            pattern_parts += [re.escape(question[position:start]), "(.+?)"]
+            static_text += question[position:start] + " "
+            position = end
+        pattern_parts.append(re.escape(question[position:]))
+        static_text += question[position:]
+        if len(re.findall(r"\w+", static_text)) < self._min_static_words:
+            return False
+        pattern = "".join(pattern_parts)
+        self._templates[pattern] = (cypher_template, [(name, lowercase) for _, _, name, lowercase in slots])
+        self._templates.move_to_end(pattern)
+        if len(self._templates) > self._max_size:
+            self._templates.popitem(last=False)
+        return True
+
+    #Find template matching the question and fill its parameters with values from the question
+    #Arguments:
+    # question:str - User question
+    #Returns: tuple[str, dict[str,str]]|None - Cypher template and parameters or None if no template matches
+    def match(self, question:str):
+        question = question.strip()
+        for pattern in reversed(self._templates):
+            found = re.fullmatch(pattern, question, flags=re.IGNORECASE)
+            if found:
+                cypher_template, slots = self._templates[pattern]
+                params = {}
+                for (name, lowercase), value in zip(slots, found.groups()):
+                    params[name] = value.lower() if lowercase else value
+                return cypher_template, params
+        return None
+
+    #Remove all templates
+    #Arguments: None
+    #Returns: None
+    def clear(self):
+        self._templates = OrderedDict()